@@ -3,34 +3,65 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import contextlib
+import ctypes
+import errno
 import os
 import platform
 import sqlite3
 import subprocess
 import sys
 import termios
-import time
 import tty
+import unicodedata
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from itertools import chain
 from pathlib import Path
-from shutil import copyfile
 from sqlite3 import Connection, Error
 from typing import cast
 
-# Offset between Unix epoch (1970-01-01) and Apple epoch (2001-01-01)
-APPLE_EPOCH_OFFSET = 978307200.825232
+# Offset between Unix epoch (1970-01-01) and Apple epoch (2001-01-01), in ns
+APPLE_EPOCH_OFFSET_NS = 978307200 * 1_000_000_000
 
+# Characters not allowed in exported filenames, mapped to "_"
+_LABEL_TRANSLATION = str.maketrans("/:", "__")
 
-@dataclass
+# Fixed memo queries, keyed by macOS major version, so sqlite3's statement
+# cache can reuse the compiled statement. Sonoma (14+) uses
+# ZCUSTOMLABELFORSORTING, earlier uses ZCUSTOMLABEL.
+_STMT = {
+    14: "SELECT ZDATE, ZDURATION, ZCUSTOMLABELFORSORTING, ZPATH FROM ZCLOUDRECORDING ORDER BY ZDATE",
+    0: "SELECT ZDATE, ZDURATION, ZCUSTOMLABEL, ZPATH FROM ZCLOUDRECORDING ORDER BY ZDATE",
+}
+
+# Chunk size for the sendfile and buffered copy fallbacks
+COPY_BUFSIZE = 1024 * 1024
+
+# Concurrent copies in --all mode; queue-depth parallelism is all we need
+EXPORT_WORKERS = 8
+
+# clonefile(2) from libSystem, only available on macOS 10.12+
+try:
+    _clonefile = ctypes.CDLL("/usr/lib/libSystem.dylib", use_errno=True).clonefile
+    _clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32]
+    _clonefile.restype = ctypes.c_int
+except (OSError, AttributeError):
+    _clonefile = None
+
+
+@dataclass(slots=True)
 class Memo:
-    """Represents a voice memo with its metadata and paths."""
+    """Represents a voice memo with its display strings and paths."""
 
-    date: datetime
-    duration: timedelta
-    label: str | None
-    source_path: Path | None
-    dest_path: Path | None
+    ts_ns: int
+    date_str: str
+    duration_str: str
+    source_path: str | None
+    dest_path: str | None
 
     @classmethod
     def from_row(
@@ -42,167 +73,353 @@ class Memo:
         date_format: str,
     ) -> Memo:
         """Create a Memo from a database row."""
-        date = datetime.fromtimestamp(row[0] + APPLE_EPOCH_OFFSET)
-        duration = timedelta(seconds=row[1])
-        label = (
-            row[2].replace("/", "_").replace(":", "_")
-            if row[2]
-            else None
-        )
+        ts_ns = int(row[0] * 1e9) + APPLE_EPOCH_OFFSET_NS
+        date = datetime.fromtimestamp(ts_ns / 1e9)
+        label = row[2].translate(_LABEL_TRANSLATION) if row[2] else None
 
         rel_path = row[3]
         if rel_path:
-            source_path = db_dir / rel_path
-            extension = Path(rel_path).suffix
-            filename = label + extension if label else Path(rel_path).name
+            source_path = os.path.join(db_dir, rel_path)
+            extension = os.path.splitext(rel_path)[1]
+            filename = label + extension if label else os.path.basename(rel_path)
             if date_in_name:
                 filename = date.strftime(date_format) + filename
-            dest_path = export_path / filename
+            dest_path = os.path.join(export_path, filename)
         else:
             source_path = None
             dest_path = None
 
-        return cls(date, duration, label, source_path, dest_path)
-
-    @property
-    def date_str(self) -> str:
-        return self.date.strftime("%d.%m.%Y %H:%M:%S")
-
-    @property
-    def duration_str(self) -> str:
-        return format_duration(self.duration)
+        return cls(
+            ts_ns,
+            date.strftime("%d.%m.%Y %H:%M:%S"),
+            format_duration(timedelta(seconds=row[1])),
+            source_path,
+            dest_path,
+        )
 
 
 def format_duration(td: timedelta) -> str:
     """Format a timedelta as HH:MM:SS.cc string."""
-    total_seconds = td.total_seconds()
-    hours, remainder = divmod(int(total_seconds), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    centiseconds = int((total_seconds - int(total_seconds)) * 100)
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
-
-
-def truncate_str(s: str, width: int) -> str:
-    """Truncate string with ellipsis if longer than width."""
-    if len(s) <= width:
-        return s
-    return "..." + s[-(width - 3) :]
-
-
-def read_key() -> int:
-    """Read a single keypress and return its code."""
+    seconds = td.days * 86400 + td.seconds
+    centiseconds = td.microseconds // 10000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{centiseconds:02d}"
+
+
+def _advise_sequential(fd: int) -> None:
+    """Best-effort hint that a file will be read sequentially.
+
+    Only has an effect where posix_fadvise exists (Linux). macOS has no
+    equivalent worth a syscall, since read-ahead is already on by default.
+    """
+    if hasattr(os, "posix_fadvise"):
+        with contextlib.suppress(OSError):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+def _fast_copy(src: str, dst: str, size: int | None = None) -> None:
+    """Copy src to dst, trying an APFS clone, then sendfile, then a buffered loop.
+
+    A known source size caps the chunk and buffer size for small files.
+    """
+    if _clonefile is not None:
+        if _clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0:
+            return
+        err = ctypes.get_errno()
+        # Not APFS, different volume, or dst already exists: copy the bytes
+        if err not in (errno.ENOTSUP, errno.EXDEV, errno.EEXIST):
+            raise OSError(err, os.strerror(err), src)
+
+    bufsize = COPY_BUFSIZE if size is None else min(max(size, 1), COPY_BUFSIZE)
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb") as fdst:
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        _advise_sequential(in_fd)
+        offset = 0
+        try:
+            while sent := os.sendfile(out_fd, in_fd, offset, bufsize):
+                offset += sent
+            return
+        except OSError:
+            # macOS only sends to sockets; fall back unless we failed midway
+            if offset:
+                raise
+
+        buf = bytearray(bufsize)
+        view = memoryview(buf)
+        while n := fsrc.readinto(buf):
+            fdst.write(view[:n])
+
+
+@contextlib.contextmanager
+def _raw_stdin() -> Generator[None, None, None]:
+    """Put the terminal in cbreak mode without echo for the duration of the block."""
     fd = sys.stdin.fileno()
     old_settings = termios.tcgetattr(fd)
     try:
         new_settings = termios.tcgetattr(fd)
         new_settings[3] = new_settings[3] & ~termios.ECHO
         termios.tcsetattr(fd, termios.TCSADRAIN, new_settings)
-        tty.setcbreak(sys.stdin)
-        return ord(sys.stdin.read(1))
+        tty.setcbreak(fd)
+        yield
     finally:
         termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
 
+def read_key() -> int:
+    """Read a single keypress and return its code (stdin must be in raw mode)."""
+    return os.read(sys.stdin.fileno(), 1)[0]
+
+
 class Table:
     """ASCII table renderer with Unicode box-drawing characters."""
 
-    def __init__(self, columns: list[tuple[str, int]]) -> None:
+    def __init__(self, columns: list[tuple[str, int]], buffered: bool = False) -> None:
+        self.buffered: bool = buffered
+        self._buf: list[str] = []
         self.columns: list[tuple[str, int]] = columns
         self.widths: list[int] = [w for _, w in columns]
         self.names: list[str] = [n for n, _ in columns]
-
-    def _format_cells(self, cells: list[str], sep: str) -> str:
-        """Format cells with given separator."""
-        formatted = [f"{cell:{w}}" for cell, w in zip(cells, self.widths)]
-        return sep.join(formatted)
+        self._top: str = self._horizontal_line("┌", "┬", "┐")
+        self._mid: str = self._horizontal_line("├", "┼", "┤")
+        self._bot: str = self._horizontal_line("└", "┴", "┘")
 
     def _horizontal_line(self, left: str, mid: str, right: str) -> str:
         """Create a horizontal line with given corner/junction characters."""
         segments = ["─" * w for w in self.widths]
         return left + "─" + ("─" + mid + "─").join(segments) + "─" + right
 
+    def _format_row(self, cells: list[str]) -> str:
+        """Pad cells to their column widths and join them with borders."""
+        return "│ " + " │ ".join(map(str.ljust, cells, self.widths)) + " │"
+
+    def _print(self, line: str, end: str = "\n") -> None:
+        """Print a line, or queue it until flush() when buffered."""
+        if self.buffered:
+            self._buf.append(line + end)
+        else:
+            print(line, end=end)
+
     def print_header(self) -> None:
         """Print the table header with column names."""
-        print(self._horizontal_line("┌", "┬", "┐"))
-        print("│ " + self._format_cells(self.names, " │ ") + " │")
-        print(self._horizontal_line("├", "┼", "┤"))
+        self._print(self._top)
+        self._print(self._format_row(self.names))
+        self._print(self._mid)
 
     def print_row(self, cells: list[str], end: str = "\n") -> None:
         """Print a data row."""
-        print("│ " + self._format_cells(cells, " │ ") + " │", end=end)
+        self._print(self._format_row(cells), end=end)
 
     def print_footer(self) -> None:
         """Print the table footer."""
-        print(self._horizontal_line("└", "┴", "┘"))
+        self._print(self._bot)
+
+    def flush(self) -> None:
+        """Write all queued lines at once."""
+        if self._buf:
+            sys.stdout.write("".join(self._buf))
+            sys.stdout.flush()
+            self._buf.clear()
 
 
 def create_connection(db_file: Path) -> Connection | None:
     """Create a database connection to the SQLite database."""
     try:
-        return sqlite3.connect(db_file)
+        # Read-only, but not immutable: Voice Memos keeps recent changes in the WAL
+        conn = sqlite3.connect(f"{db_file.absolute().as_uri()}?mode=ro", uri=True)
+        conn.execute("PRAGMA query_only=1")
+        # Let SQLite mmap the database and keep its page cache in memory
+        conn.execute("PRAGMA mmap_size=1073741824")
+        conn.execute("PRAGMA cache_size=-131072")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
     except Error as e:
         print(e)
         return None
 
 
-def get_all_memos(
+def iter_memos(
     conn: Connection, major_version: int
-) -> list[tuple[float, float, str | None, str | None]]:
-    """Query all memos from the database."""
+) -> Iterator[tuple[float, float, str | None, str | None]]:
+    """Query all memos from the database, streaming rows from the cursor in batches."""
     cur = conn.cursor()
-    # Sonoma (14+) uses ZCUSTOMLABELFORSORTING, earlier uses ZCUSTOMLABEL
-    label_column = "ZCUSTOMLABELFORSORTING" if major_version >= 14 else "ZCUSTOMLABEL"
-    cur.execute(
-        f"SELECT ZDATE, ZDURATION, {label_column}, ZPATH FROM ZCLOUDRECORDING ORDER BY ZDATE"
-    )
-    return cur.fetchall()
+    cur.arraysize = 512
+    cur.execute(_STMT[14 if major_version >= 14 else 0])
+    while batch := cur.fetchmany():
+        yield from batch
+
+
+def _row_data(memo: Memo, old_path_width: int, new_path_width: int) -> list[str]:
+    """Build the table cells describing a memo, without the status column.
+
+    Paths longer than their column are truncated from the left with an ellipsis.
+    """
+    old_path_short = os.path.basename(memo.source_path) if memo.source_path else ""
+    if len(old_path_short) > old_path_width:
+        old_path_short = "..." + old_path_short[-(old_path_width - 3) :]
+    new_path_short = memo.dest_path or ""
+    if len(new_path_short) > new_path_width:
+        new_path_short = "..." + new_path_short[-(new_path_width - 3) :]
+    return [
+        memo.date_str,
+        memo.duration_str,
+        old_path_short,
+        new_path_short,
+    ]
 
 
-def process_memos(
-    memos: list[Memo],
-    table: Table,
-    export_all: bool,
-) -> None:
+def _source_size(path: str, listings: dict[str, dict[str, int]]) -> int | None:
+    """Return the size of a source file, or None if it does not exist.
+
+    Each directory is scanned once with os.scandir and cached in listings, so
+    missing files are known before prompting. This stats every file in the
+    directory once, including ones the database does not reference. Names not
+    found verbatim are checked on disk, since APFS/HFS+ match them case- and
+    normalization-insensitively.
+    """
+    dirname, name = os.path.split(path)
+    listing = listings.get(dirname)
+    if listing is None:
+        listing = listings[dirname] = {}
+        try:
+            entries = os.scandir(dirname)
+        except FileNotFoundError:
+            return None
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        listing[entry.name] = entry.stat().st_size
+                except FileNotFoundError:
+                    continue  # removed while scanning
+    size = listing.get(name)
+    if size is None and os.path.isfile(path):
+        size = os.path.getsize(path)
+    return size
+
+
+def _dest_key(path: str | Path) -> str:
+    """Fold a destination path the way default APFS/HFS+ volumes compare names."""
+    return unicodedata.normalize("NFD", os.fspath(path)).casefold()
+
+
+def _copy_and_touch(memo: Memo, size: int | None = None) -> None:
+    """Export a memo and set its modification time to the recording date."""
+    assert memo.source_path is not None and memo.dest_path is not None
+    _fast_copy(memo.source_path, memo.dest_path, size)
+    os.utime(memo.dest_path, ns=(memo.ts_ns, memo.ts_ns))
+
+
+def process_memos(memos: Iterable[Memo], table: Table) -> None:
     """Process and optionally export each memo with user interaction."""
     old_path_width = table.widths[2]
     new_path_width = table.widths[3]
-
-    for memo in memos:
-        old_path_short = truncate_str(
-            memo.source_path.name if memo.source_path else "", old_path_width
-        )
-        new_path_short = truncate_str(
-            str(memo.dest_path) if memo.dest_path else "", new_path_width
-        )
-
-        row_data = [
-            memo.date_str,
-            memo.duration_str,
-            old_path_short,
-            new_path_short,
-        ]
-
-        if not memo.source_path:
-            table.print_row(row_data + ["No File"])
-            continue
-
-        if export_all:
-            key = 10  # Enter
-        else:
+    listings: dict[str, dict[str, int]] = {}
+
+    # Raw mode is entered on the first prompt, and restored when the loop ends
+    with contextlib.ExitStack() as stack:
+        raw = False
+        for memo in memos:
+            row_data = _row_data(memo, old_path_width, new_path_width)
+
+            size = _source_size(memo.source_path, listings) if memo.source_path else None
+            if size is None:
+                table.print_row(row_data + ["No File"])
+                continue
+
+            if not raw:
+                stack.enter_context(_raw_stdin())
+                raw = True
             table.print_row(row_data + ["Export?"], end="\r")
             key = 0
             while key not in (10, 27):
                 key = read_key()
 
-        assert memo.source_path is not None and memo.dest_path is not None
-        match key:
-            case 10:  # Enter - export
-                copyfile(memo.source_path, memo.dest_path)
-                mod_time = time.mktime(memo.date.timetuple())
-                os.utime(memo.dest_path, (mod_time, mod_time))
-                table.print_row(row_data + ["Exported!"])
-            case 27:  # Escape - skip
-                table.print_row(row_data + ["Skipped"])
+            match key:
+                case 10:  # Enter - export
+                    _copy_and_touch(memo, size)
+                    table.print_row(row_data + ["Exported!"])
+                case 27:  # Escape - skip
+                    table.print_row(row_data + ["Skipped"])
+
+
+async def process_memos_all(memos: Iterable[Memo], table: Table) -> None:
+    """Export every memo, overlapping the copies on a thread pool."""
+    old_path_width = table.widths[2]
+    new_path_width = table.widths[3]
+    listings: dict[str, dict[str, int]] = {}
+    loop = asyncio.get_running_loop()
+
+    async def export(group: list[tuple[Memo, int, list[str]]]) -> None:
+        # Memos sharing a destination are copied one after another, so the
+        # last one wins as in the interactive path instead of interleaving
+        for memo, size, row_data in group:
+            try:
+                await loop.run_in_executor(pool, _copy_and_touch, memo, size)
+            except Exception:
+                row_data.append("Failed")
+                raise
+            row_data.append("Exported!")
+
+    rows: list[list[str]] = []
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+        groups: dict[str, list[tuple[Memo, int, list[str]]]] = {}
+        for memo in memos:
+            row_data = _row_data(memo, old_path_width, new_path_width)
+            rows.append(row_data)
+            size = _source_size(memo.source_path, listings) if memo.source_path else None
+            if size is None:
+                row_data.append("No File")
+                continue
+            assert memo.dest_path is not None
+            groups.setdefault(_dest_key(memo.dest_path), []).append((memo, size, row_data))
+
+        results = await asyncio.gather(
+            *(export(group) for group in groups.values()), return_exceptions=True
+        )
+
+    # Rows are printed in date order once every copy has finished or failed;
+    # memos queued behind a failed copy to the same file were never attempted
+    for row_data in rows:
+        if len(row_data) < len(table.widths):
+            row_data.append("Skipped")
+        table.print_row(row_data)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+def open_in_finder(path: Path) -> None:
+    """Open a folder in Finder via LaunchServices, falling back to open(1)."""
+    try:
+        cf = ctypes.CDLL("/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation")
+        cs = ctypes.CDLL("/System/Library/Frameworks/CoreServices.framework/CoreServices")
+    except OSError:
+        subprocess.Popen(["open", path])
+        return
+
+    cf.CFURLCreateFromFileSystemRepresentation.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_char_p,
+        ctypes.c_long,
+        ctypes.c_bool,
+    ]
+    cf.CFURLCreateFromFileSystemRepresentation.restype = ctypes.c_void_p
+    cf.CFRelease.argtypes = [ctypes.c_void_p]
+    cs.LSOpenCFURLRef.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    cs.LSOpenCFURLRef.restype = ctypes.c_int32
+
+    raw_path = os.fsencode(path)
+    url = cast(
+        int | None,
+        cf.CFURLCreateFromFileSystemRepresentation(None, raw_path, len(raw_path), True),
+    )
+    if not url:
+        subprocess.Popen(["open", path])
+        return
+    try:
+        if cs.LSOpenCFURLRef(url, None) != 0:
+            subprocess.Popen(["open", path])
+    finally:
+        cf.CFRelease(url)
 
 
 def main() -> None:
@@ -273,8 +490,8 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    db_path = cast(Path, args.db_path).expanduser().resolve()
-    export_path = cast(Path, args.export_path).expanduser().resolve()
+    db_path = Path(os.path.abspath(os.path.expanduser(cast(Path, args.db_path))))
+    export_path = Path(os.path.abspath(os.path.expanduser(cast(Path, args.export_path))))
     export_all = cast(bool, args.all)
     date_in_name = cast(bool, args.date_in_name)
     date_in_name_format = cast(str, args.date_in_name_format)
@@ -292,33 +509,46 @@ def main() -> None:
         print("location and run this tool with --db-path pointing to the copy.")
         exit(1)
 
+    # Prompting reads single keys from the terminal
+    if not export_all and not sys.stdin.isatty():
+        print("Prompting requires an interactive terminal.")
+        print("Use --all to export all memos without prompting.")
+        exit(1)
+
+    # Follow symlinks so recordings are looked up next to the real database
+    db_path = db_path.resolve()
+
     # Load memos from database
     conn = create_connection(db_path)
     if not conn:
         exit(1)
-    with conn:
-        rows = get_all_memos(conn, major_version)
-    if not rows:
+    rows = iter_memos(conn, major_version)
+    first_row = next(rows, None)
+    if first_row is None:
         print("No memos found.")
         exit(0)
 
-    # Convert rows to Memo objects
-    memos = [
+    # Convert rows to Memo objects lazily, as they are streamed from the cursor
+    memos = (
         Memo.from_row(row, db_path.parent, export_path, date_in_name, date_in_name_format)
-        for row in rows
-    ]
+        for row in chain([first_row], rows)
+    )
 
     # Create export folder
-    export_path.mkdir(exist_ok=True)
+    os.makedirs(export_path, exist_ok=True)
 
     # Set up table
-    table = Table([
-        ("Date", 19),
-        ("Duration", 11),
-        ("Old Path", 32),
-        ("New Path", 60),
-        ("Status", 12),
-    ])
+    # Without prompts the table is only a log, so render it in one write
+    table = Table(
+        [
+            ("Date", 19),
+            ("Duration", 11),
+            ("Old Path", 32),
+            ("New Path", 60),
+            ("Status", 12),
+        ],
+        buffered=export_all,
+    )
 
     # Print instructions and header
     print()
@@ -327,18 +557,25 @@ def main() -> None:
         print()
     table.print_header()
 
-    # Process memos
-    process_memos(memos, table, export_all)
+    # Process memos, always printing the table so far if an export fails
+    try:
+        if export_all:
+            asyncio.run(process_memos_all(memos, table))
+        else:
+            process_memos(memos, table)
+    finally:
+        conn.close()
+        table.print_footer()
+        table.flush()
 
-    # Print footer and summary
-    table.print_footer()
+    # Print summary
     print()
     print(f"Done. Memos exported to: {export_path}")
     print()
 
     # Open Finder if requested
     if not no_finder:
-        subprocess.Popen(["open", export_path])
+        open_in_finder(export_path)
 
 
 if __name__ == "__main__":